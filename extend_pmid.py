@@ -1,16 +1,62 @@
 from metapub import PubMedFetcher, FindIt
 from dotenv import load_dotenv
-from tqdm import tqdm
+from tqdm.auto import tqdm
+from lxml import etree
+from more_itertools import chunked
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import requests
+import sqlite3
+import json
 import random
-from time import sleep
+from time import sleep, monotonic
 import os
 from math import ceil
+from itertools import islice
+from functools import partial
+from operator import attrgetter, itemgetter
+from heapq import nlargest
 
 load_dotenv()
 
-fetcher = PubMedFetcher(cachedir="./.cache/", api_key=os.getenv("NCBI_API_KEY"))
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+BATCH_SIZE = 200  # PMIDs per ELink/EFetch request
+MAX_WORKERS = 10  # Concurrent E-utilities requests
+TQDM_OPTIONS = {"mininterval": 0.5, "smoothing": 0}  # Fewer progress bar refreshes from busy worker threads
+CACHE_PATH = Path("./.cache/articles.sqlite")
+
+# Shared connection pool for all HTTP traffic so repeated requests to the same host reuse TCP/TLS connections
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=None,  # E-utilities POSTs are read-only, so they are safe to retry as well
+        ),
+    ),
+)
+
+fetcher = PubMedFetcher(cachedir="./.cache/", api_key=NCBI_API_KEY)
+
+# ELink linknames mapped to the keys used in `Article.related`
+_LINKNAMES = {
+    "pubmed_pubmed": "pubmed",
+    "pubmed_pubmed_citedin": "citedin",
+    "pubmed_pubmed_refs": "refs",
+}
+
+# Bibliography fields stored in `Article.bib`, read from metapub's `PubMedArticle` in one call
+_BIB_KEYS = ("authors_str", "title", "doi", "year", "journal", "keywords", "abstract")
+_BIB_GETTER = attrgetter(*_BIB_KEYS)
 
 
 def _exponential_backoff(attempt, base_delay=1, max_delay=60):
@@ -20,33 +66,356 @@ def _exponential_backoff(attempt, base_delay=1, max_delay=60):
     return delay + jitter
 
 
+class RateLimiter:
+    """Thread-safe limiter that spaces calls to `acquire` at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_call = 0.0
+        self.lock = Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = monotonic()
+            wait = max(0.0, self.next_call - now)
+            self.next_call = max(now, self.next_call) + self.interval
+        if wait:
+            sleep(wait)
+
+
+# NCBI allows 10 requests/s with an API key and 3 without; stay below either limit
+_rate_limiter = RateLimiter(rate=9 if NCBI_API_KEY else 2)
+
+
+class ArticleCache:
+    """
+    Persistent cache of fetched article data keyed by PMID.
+    Each PMID is one row of a single SQLite table holding its "related", "bib" and "findit" (PDF location)
+    dictionaries as JSON, with an in-process dictionary in front for repeated lookups.
+    """
+
+    KINDS = ("related", "bib", "findit")
+
+    def __init__(self, path: str | Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # In WAL mode with synchronous=NORMAL, committing a batch of results does not wait on an fsync
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles (pmid TEXT PRIMARY KEY, related TEXT, bib TEXT, findit TEXT)"
+        )
+        # Caches created before a kind was added lack its column
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(articles)")}
+        for kind in self.KINDS:
+            if kind not in columns:
+                self.conn.execute(f"ALTER TABLE articles ADD COLUMN {kind} TEXT")
+        self.memory = {}
+        self.lock = Lock()
+
+    def get(self, kind: str, pmid: str) -> dict | None:
+        return self.get_many(kind, [pmid]).get(pmid)
+
+    def get_many(self, kind: str, pmids) -> dict[str, dict]:
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown cache kind: {kind}")
+        found = {pmid: self.memory[kind, pmid] for pmid in pmids if (kind, pmid) in self.memory}
+        missing = [pmid for pmid in pmids if pmid not in found]
+        with self.lock:
+            for batch in chunked(missing, 500):
+                rows = self.conn.execute(
+                    f"SELECT pmid, {kind} FROM articles WHERE {kind} IS NOT NULL "
+                    f"AND pmid IN ({', '.join('?' * len(batch))})",
+                    batch,
+                )
+                for pmid, data in rows:
+                    found[pmid] = self.memory[kind, pmid] = json.loads(data)
+        return found
+
+    def put_many(self, kind: str, items: dict[str, dict]):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown cache kind: {kind}")
+        with self.lock, self.conn:
+            # Upsert only this kind's column so the other one is kept
+            self.conn.executemany(
+                f"INSERT INTO articles (pmid, {kind}) VALUES (?, ?) "
+                f"ON CONFLICT (pmid) DO UPDATE SET {kind} = excluded.{kind}",
+                [(pmid, json.dumps(data)) for pmid, data in items.items()],
+            )
+            self.memory.update(((kind, pmid), data) for pmid, data in items.items())
+
+
+_cache = ArticleCache(CACHE_PATH)
+
+
+def _eutils_post(endpoint, stream: bool = False, **params):
+    """POST a request to an E-utilities endpoint, adding the API key if available"""
+    if NCBI_API_KEY:
+        params["api_key"] = NCBI_API_KEY
+    _rate_limiter.acquire()
+    response = SESSION.post(EUTILS_URL + endpoint, data=params, timeout=30, stream=stream)
+    response.raise_for_status()
+    return response
+
+
+def _batch_fetch_related(pmids: list[str]) -> dict[str, dict]:
+    """
+    Fetch related, citing and referenced PMIDs for a batch of PMIDs with a single ELink call.
+    Args:
+        pmids: List of PMIDs
+    Returns:
+        Dictionary mapping each PMID to a dictionary with "pubmed", "citedin" and "refs" lists
+    """
+    # Repeated `id` parameters (rather than a comma-separated list) make ELink return one linkset per PMID
+    response = _eutils_post("elink.fcgi", dbfrom="pubmed", db="pubmed", cmd="neighbor", id=pmids, retmode="json")
+
+    # ELink reports errors with HTTP 200 and an "ERROR" key; raise so the batch is retried instead of
+    # dropping it, or caching empty link lists for its PMIDs
+    result = response.json()
+    if "ERROR" in result:
+        raise Exception(f"ELink failed: {result['ERROR']}")
+
+    related = {}
+    for linkset in result.get("linksets", []):
+        if "ERROR" in linkset:
+            raise Exception(f"ELink failed for {linkset.get('ids')}: {linkset['ERROR']}")
+        links = {key: [] for key in _LINKNAMES.values()}
+        for linksetdb in linkset.get("linksetdbs", []):
+            key = _LINKNAMES.get(linksetdb.get("linkname"))
+            if key:
+                links[key] = [str(pmid) for pmid in linksetdb.get("links", [])]
+        for pmid in linkset.get("ids", []):
+            related[str(pmid)] = links
+    return related
+
+
+def _xpath(path):
+    # Plain `str` results instead of lxml "smart strings", which keep the whole parsed response alive
+    return etree.XPath(path, smart_strings=False)
+
+
+# Compiled once and evaluated relative to a `PubmedArticle` element
+_XPATH_PMID = _xpath("string(MedlineCitation/PMID)")
+_XPATH_AUTHORS = _xpath("MedlineCitation/Article/AuthorList/Author")
+_XPATH_LASTNAME = _xpath("string(LastName)")
+_XPATH_INITIALS = _xpath("string(Initials)")
+_XPATH_COLLECTIVE_NAME = _xpath("string(CollectiveName)")
+_XPATH_TITLE = _xpath("string(MedlineCitation/Article/ArticleTitle)")
+_XPATH_DOI = _xpath("string(PubmedData/ArticleIdList/ArticleId[@IdType='doi'])")
+_XPATH_ELOCATION_DOI = _xpath("string(MedlineCitation/Article/ELocationID[@EIdType='doi'])")
+_XPATH_YEAR = _xpath("string(MedlineCitation/Article/Journal/JournalIssue/PubDate/Year)")
+_XPATH_MEDLINE_YEAR = _xpath("substring(MedlineCitation/Article/Journal/JournalIssue/PubDate/MedlineDate, 1, 4)")
+_XPATH_JOURNAL = _xpath("string(MedlineCitation/Article/Journal/ISOAbbreviation)")
+_XPATH_MEDLINE_TA = _xpath("string(MedlineCitation/MedlineJournalInfo/MedlineTA)")
+_XPATH_KEYWORDS = _xpath("MedlineCitation/KeywordList/Keyword")
+_XPATH_ABSTRACT = _xpath("MedlineCitation/Article/Abstract/AbstractText")
+_XPATH_TEXT = _xpath("string()")
+
+
+def _parse_bib(node):
+    """Extract the bibliography fields from a `PubmedArticle` XML element"""
+    authors = []
+    for author in _XPATH_AUTHORS(node):
+        lastname, initials = _XPATH_LASTNAME(author), _XPATH_INITIALS(author)
+        if lastname:
+            authors.append(f"{lastname} {initials}" if initials else lastname)
+        elif collective_name := _XPATH_COLLECTIVE_NAME(author):
+            authors.append(collective_name)
+
+    return {
+        "authors_str": "; ".join(authors),
+        "title": _XPATH_TITLE(node) or None,
+        "doi": _XPATH_DOI(node) or _XPATH_ELOCATION_DOI(node) or None,
+        "year": _XPATH_YEAR(node) or _XPATH_MEDLINE_YEAR(node) or None,
+        "journal": _XPATH_JOURNAL(node) or _XPATH_MEDLINE_TA(node) or None,
+        "keywords": [_XPATH_TEXT(keyword) for keyword in _XPATH_KEYWORDS(node)],
+        "abstract": "\n".join(_XPATH_TEXT(text) for text in _XPATH_ABSTRACT(node)) or None,
+    }
+
+
+def _iter_pubmed_articles(source):
+    """
+    Incrementally parse an EFetch response, yielding each `PubmedArticle` and freeing it once consumed.
+    Raises if the response is an E-utilities error (e.g. an expired WebEnv) or not a `PubmedArticleSet`,
+    so the page is retried instead of silently yielding nothing.
+    """
+    # `huge_tree` lifts libxml2's default size limits, which large EFetch responses can exceed
+    context = etree.iterparse(source, tag=("PubmedArticle", "ERROR"), huge_tree=True, recover=True)
+    for _, node in context:
+        if node.tag == "ERROR":
+            raise Exception(f"EFetch failed: {node.text}")
+        yield node
+        node.clear()
+        while node.getprevious() is not None:
+            del node.getparent()[0]
+    if context.root is None or context.root.tag != "PubmedArticleSet":
+        raise Exception("EFetch failed: response is not a PubmedArticleSet")
+
+
+def _epost(pmids: list[str]) -> tuple[str, str]:
+    """Upload PMIDs to the E-utilities history server and return their (WebEnv, query_key)"""
+    response = _eutils_post("epost.fcgi", db="pubmed", id=",".join(pmids))
+    root = etree.fromstring(response.content)
+    if root.findtext("WebEnv") is None:
+        raise Exception(f"EPost failed: {root.findtext('ERROR')}")
+    return root.findtext("WebEnv"), root.findtext("QueryKey")
+
+
+def _efetch_bibs(**params) -> dict[str, dict]:
+    """Run an EFetch for PubMed XML records and parse the bibliography of each `PubmedArticle`"""
+    with _eutils_post("efetch.fcgi", stream=True, db="pubmed", retmode="xml", **params) as response:
+        response.raw.decode_content = True
+        return {_XPATH_PMID(node): _parse_bib(node) for node in _iter_pubmed_articles(response.raw)}
+
+
+def _batch_fetch_bib(webenv: str, query_key: str, records: range) -> dict[str, dict]:
+    """
+    Fetch bibliographies for a page of previously EPosted PMIDs with a single EFetch call.
+    Args:
+        webenv: WebEnv returned by `_epost`
+        query_key: Query key returned by `_epost`
+        records: Positions of the records to fetch within the EPosted PMID list
+    Returns:
+        Dictionary mapping each PMID to its bibliography dictionary
+    """
+    return _efetch_bibs(WebEnv=webenv, query_key=query_key, retstart=records.start, retmax=len(records))
+
+
+def _batch_fetch_bib_by_id(pmids: list[str]) -> dict[str, dict]:
+    """Fetch bibliographies for a batch of PMIDs by listing them in a single EFetch call"""
+    return _efetch_bibs(id=",".join(pmids))
+
+
+def _fetch_batch(batch: list[str] | range, batch_fetch, max_retries: int = 3, pbar=None):
+    """
+    Call `batch_fetch` on a batch of PMIDs (or record positions), retrying with exponential backoff.
+    Retries are reported on `pbar` if given, otherwise printed.
+    """
+    message = None
+    try:
+        for attempt in range(max_retries):
+            try:
+                return batch_fetch(batch)
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    raise Exception(
+                        f"Failed to fetch batch of {len(batch)} PMIDs after {max_retries} attempts: {str(e)}"
+                    )
+                delay = _exponential_backoff(attempt)
+                message = f"Retrying {len(batch)} PMIDs after {delay:.1f}s (attempt {attempt + 1}/{max_retries})"
+                if pbar is not None:
+                    pbar.set_postfix_str(message)
+                else:
+                    print(message)
+                sleep(delay)
+    finally:
+        # The postfix is shared by all workers; only clear it if it still shows this batch's message
+        if pbar is not None and message is not None and pbar.postfix == message:
+            pbar.set_postfix_str("")
+
+
+def _fetch_in_batches(batches, batch_fetch, max_retries: int = 3, desc: str | None = None) -> dict[str, dict]:
+    """
+    Fetch batches concurrently and merge the results of `batch_fetch`.
+    Batches that still fail after `max_retries` attempts are skipped.
+    """
+    results = {}
+    batches = list(batches)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, tqdm(
+        total=len(batches), desc=desc, **TQDM_OPTIONS
+    ) as pbar:
+        futures = [executor.submit(_fetch_batch, batch, batch_fetch, max_retries, pbar) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                results.update(future.result())
+            except Exception as e:
+                pbar.write(str(e))
+            pbar.update()
+    return results
+
+
+def _fetch_related_many(pmids: list[str], max_retries: int = 3, desc: str | None = None) -> dict[str, dict]:
+    """Fetch related articles for PMIDs with one ELink call per `BATCH_SIZE` PMIDs"""
+    return _fetch_in_batches(chunked(pmids, BATCH_SIZE), _batch_fetch_related, max_retries, desc)
+
+
+def _fetch_bib_many(pmids: list[str], max_retries: int = 3, desc: str | None = None) -> dict[str, dict]:
+    """
+    EPost all PMIDs once, then page through their bibliographies `BATCH_SIZE` records at a time.
+    Pages that fail, e.g. because the WebEnv expired, are refetched by PMID list instead of through the history.
+    """
+    if not pmids:
+        return {}
+    results = {}
+    try:
+        webenv, query_key = _fetch_batch(pmids, _epost, max_retries)
+    except Exception as e:
+        print(str(e))
+    else:
+        pages = [range(start, min(start + BATCH_SIZE, len(pmids))) for start in range(0, len(pmids), BATCH_SIZE)]
+        # A single attempt per page: retrying with the same WebEnv cannot recover an expired one
+        results = _fetch_in_batches(pages, partial(_batch_fetch_bib, webenv, query_key), 1, desc)
+
+    missing = [pmid for pmid in pmids if pmid not in results]
+    if missing:
+        print(f"Fetching {len(missing)} PMIDs missing from the history server results by PMID")
+        results |= _fetch_in_batches(chunked(missing, BATCH_SIZE), _batch_fetch_bib_by_id, max_retries, desc)
+    return results
+
+
+def _fetch_cached(pmids, kind: str, fetch_many, max_retries: int = 3, desc: str | None = None) -> dict[str, dict]:
+    """Look up PMIDs in the article cache and fetch only the missing ones with `fetch_many`"""
+    results = _cache.get_many(kind, pmids)
+    fetched = fetch_many([pmid for pmid in pmids if pmid not in results], max_retries, desc)
+    _cache.put_many(kind, fetched)
+    return results | fetched
+
+
 class Article:
-    def __init__(self, pmid: str | int, include_bib: bool = False, max_retries: int = 3):
+    def __init__(
+        self,
+        pmid: str | int,
+        include_bib: bool = False,
+        max_retries: int = 3,
+        prefetched: dict | None = None,
+        include_related: bool = True,
+    ):
+        """
+        Args:
+            pmid: PubMed ID
+            include_bib: Whether to fetch the bibliography
+            max_retries: Maximum number of retries for fetching the article
+            prefetched: Already fetched "related" and/or "bib" dictionaries, e.g. from a batched request.
+                Only the missing parts are fetched.
+            include_related: Whether to fetch related, citing and referenced articles
+        """
         if isinstance(pmid, int):
             pmid = str(pmid)
         self.pmid = pmid
+        prefetched = prefetched or {}
 
-        if include_bib:
+        if "bib" in prefetched:
+            self.bib = prefetched["bib"]
+        elif include_bib:
             self._fetch_bib(max_retries)
 
-        self._fetch_related(max_retries)
+        if "related" in prefetched:
+            self.related = prefetched["related"]
+        elif include_related:
+            self._fetch_related(max_retries)
 
     def _fetch_bib(self, max_retries):
+        self.bib = _cache.get("bib", self.pmid)
+        if self.bib is not None:
+            return
+
         for attempt in range(max_retries):
             try:
+                _rate_limiter.acquire()
                 article = fetcher.article_by_pmid(self.pmid)
-                self.bib = {
-                    key: getattr(article, key)
-                    for key in [
-                        "authors_str",
-                        "title",
-                        "doi",
-                        "year",
-                        "journal",
-                        "keywords",
-                        "abstract",
-                    ]
-                }
+                self.bib = dict(zip(_BIB_KEYS, _BIB_GETTER(article)))
+                _cache.put_many("bib", {self.pmid: self.bib})
                 return
             except Exception as e:
                 delay = _exponential_backoff(attempt)
@@ -56,10 +425,16 @@ class Article:
                 sleep(delay)
 
     def _fetch_related(self, max_retries):
+        self.related = _cache.get("related", self.pmid)
+        if self.related is not None:
+            return
+
         for attempt in range(max_retries):
             try:
+                _rate_limiter.acquire()
                 related = fetcher.related_pmids(self.pmid)
                 self.related = {key: related.get(key, []) for key in ["pubmed", "citedin", "refs"]}
+                _cache.put_many("related", {self.pmid: self.related})
                 return
             except Exception as e:
                 delay = _exponential_backoff(attempt)
@@ -71,54 +446,46 @@ class Article:
                 sleep(delay)
 
 
-def _extend_pmid_set(pmid_set: set[str], topk: int = 10, min_pmid: int = 100, max_retries: int = 3) -> set[str]:
+def _extend_pmid_set(pmid_set: set[str | int], topk: int = 10, min_pmid: int = 100, max_retries: int = 3) -> set[str]:
     """
     Extend a set of PMIDs by fetching related articles and adding them to the set.
+    The set is extended breadth-first: each level only fetches the PMIDs discovered in the previous one.
     Args:
-        pmid_set: Set of PMIDs to extend
+        pmid_set: Set of PMIDs to extend (ints are converted to strings)
         topk: Number of related articles per parent article to fetch
         min_pmid: Minimum number of PMIDs to be included in the return set
         max_retries: Maximum number of retries for fetching articles
     Returns:
         Set of extended PMIDs
     """
+    # E-utilities results are keyed by str PMIDs
+    pmid_set = {str(pmid) for pmid in pmid_set}
+    visited = set()
+    frontier = set(pmid_set)
 
-    topk = min(ceil(min_pmid * 1.5 / len(pmid_set)), topk)
-    print(f"Fetching {topk} related articles per article")
+    while frontier:
+        topk = min(ceil(min_pmid * 1.5 / len(pmid_set)), topk)
+        print(f"Fetching {topk} related articles per article")
 
-    extended_articles = []
+        related = _fetch_cached(frontier, "related", _fetch_related_many, max_retries)
+        extended_articles = [
+            Article(pmid, prefetched={"related": related[pmid]}) for pmid in frontier if pmid in related
+        ]
+        visited |= frontier
 
-    for pmid in tqdm(pmid_set):
-        for attempt in range(max_retries):
-            try:
-                article = Article(pmid, max_retries=max_retries)
-                extended_articles.append(article)
-                break
-            except Exception as e:
-                delay = _exponential_backoff(attempt)
-                if attempt == max_retries - 1:
-                    print(f"Failed to fetch article {pmid} after {max_retries} attempts: {str(e)}")
-                else:
-                    print(f"Retrying article {pmid} after {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
-                    sleep(delay)
+        # Get new PMIDs from extended articles
+        for article in extended_articles:
+            pmid_set.update(islice(article.related["pubmed"], topk))
 
-    # Get new PMIDs from extended articles
-    new_pmid_set = pmid_set
-    for article in extended_articles:
-        new_pmid_set |= set(article.related["pubmed"][:topk])
+        if len(pmid_set) >= min_pmid:
+            break
+        print(f"Found {len(pmid_set)} articles, extending further...")
+        frontier = pmid_set - visited
 
-    if len(new_pmid_set) < min_pmid and new_pmid_set:  # Check if we have any articles
-        try:
-            print(f"Found {len(new_pmid_set)} articles, extending further...")
-            return _extend_pmid_set(new_pmid_set, topk, min_pmid, max_retries)
-        except Exception as e:
-            print(f"Stopping recursion due to error: {str(e)}")
-            return new_pmid_set
+    return pmid_set
 
-    return new_pmid_set
 
-
-def get_extended_articles(seed_pmids: list[str], topk: int = 10, min_articles: int = 50, max_retries: int = 3):
+def get_extended_articles(seed_pmids: list[str | int], topk: int = 10, min_articles: int = 50, max_retries: int = 3):
     """
     Get a list of related articles snow balling from a list of seed PMIDs.
     Args:
@@ -135,67 +502,124 @@ def get_extended_articles(seed_pmids: list[str], topk: int = 10, min_articles: i
     extended_pmid_set = _extend_pmid_set(set(seed_pmids), topk, min_articles, max_retries)
     # Return only the bibliography of the extended articles not related articles
     print(f"Fetching {len(extended_pmid_set)} articles")
+    # Run the ELink and EFetch passes side by side so backoff in one overlaps with progress in the other
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        related_future = executor.submit(
+            _fetch_cached, extended_pmid_set, "related", _fetch_related_many, max_retries, "Fetching related articles"
+        )
+        bib_future = executor.submit(
+            _fetch_cached, extended_pmid_set, "bib", _fetch_bib_many, max_retries, "Fetching final set of articles"
+        )
+        related, bibs = related_future.result(), bib_future.result()
     articles = []
-    for pmid in tqdm(extended_pmid_set, desc="Fetching final set of articles"):
-        try:
-            article = Article(pmid, include_bib=True)
-            articles.append(article)
-        except Exception as e:
-            print(f"Skipping article {pmid} due to error: {str(e)}")
+    for pmid in extended_pmid_set:
+        if pmid not in related or pmid not in bibs:
+            print(f"Skipping article {pmid}: not returned by PubMed")
             continue
+        articles.append(Article(pmid, prefetched={"related": related[pmid], "bib": bibs[pmid]}))
 
     return {"pmids": extended_pmid_set, "articles": articles}
 
 
-def get_highest_inbound_articles(extended_dict, topk=20):
-    inbounds = {}
-    for article in extended_dict["articles"]:
-        # print(f"citedin: {extended_dict['pmids'] & set(article.related['citedin'])}")
-        # print(f"refs: {extended_dict['pmids'] & set(article.related['refs'])}")
-        inbound_count = len(extended_dict["pmids"] & set(article.related["citedin"])) + len(
-            extended_dict["pmids"] & set(article.related["refs"])
-        )
-        inbounds[article.pmid] = inbound_count
-    sorted_inbounds = dict(sorted(inbounds.items(), key=lambda item: item[1], reverse=True))
+def _count_inbounds(pmid_set: set[str], articles) -> dict[str, int]:
+    """Count, for each article, the citing and referenced articles that are also in `pmid_set`"""
+    # `set.intersection` probes the big PMID set with each neighbor directly, without building a set per list
+    return {
+        article.pmid: len(pmid_set.intersection(article.related["citedin"]))
+        + len(pmid_set.intersection(article.related["refs"]))
+        for article in articles
+    }
 
-    top_inbounds = dict(list(sorted_inbounds.items())[:topk])
+
+def get_highest_inbound_articles(extended_dict, topk=20):
+    """
+    Get the articles with the most citing and referenced articles inside the extended set.
+    Args:
+        extended_dict: Dictionary returned by `get_extended_articles`
+        topk: Number of articles to return
+    Returns:
+        List of the top `topk` articles
+    """
+    inbounds = _count_inbounds(extended_dict["pmids"], extended_dict["articles"])
+    top_inbounds = {pmid for pmid, _ in nlargest(topk, inbounds.items(), key=itemgetter(1))}
 
     return [article for article in extended_dict["articles"] if article.pmid in top_inbounds]
 
 
 def _article_to_bibtex(article):
-    bibformat = """@article{{{identifier},
-        title = {{{title}}},
-        author = {{{authors_str}}},
-        year = {{{year}}},
-        journal = {{{journal}}},
-        doi = {{{doi}}},
-    }}
-    """
-    return bibformat.format(
-        identifier=article.bib.get("authors_str", " ").split(" ")[0] + article.bib.get("year"), **article.bib
+    bib = article.bib
+    # Missing fields (e.g. no year in the PubMed record) become empty strings instead of raising
+    authors, year = bib.get("authors_str") or "", bib.get("year") or ""
+    identifier = authors.split(" ")[0] + str(year)
+    return (
+        f"@article{{{identifier},\n"
+        f"    title = {{{bib.get('title') or ''}}},\n"
+        f"    author = {{{authors}}},\n"
+        f"    year = {{{year}}},\n"
+        f"    journal = {{{bib.get('journal') or ''}}},\n"
+        f"    doi = {{{bib.get('doi') or ''}}},\n"
+        f"}}\n"
     )
 
 
 def articles_to_bibtex(articles):
-    return "\n\n".join([_article_to_bibtex(article) for article in articles])
+    return "\n\n".join(_article_to_bibtex(article) for article in articles)
 
 
-def download_articles(articles, save_path="./"):
+def _download_one(article, url, save_path, session=SESSION):
+    """
+    Stream the PDF at `url` to `save_path/<pmid>.pdf` in 64 KiB chunks.
+    The file is written as `<pmid>.pdf.part` and only renamed once complete, so failed downloads leave no PDF.
+    """
+    file_path = save_path / f"{article.pmid}.pdf"
+    part_path = file_path.with_name(file_path.name + ".part")
+    try:
+        with session.get(url, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            with part_path.open("wb") as file:
+                for chunk in response.iter_content(chunk_size=65536):
+                    file.write(chunk)
+        part_path.replace(file_path)
+    except requests.exceptions.RequestException as e:
+        part_path.unlink(missing_ok=True)
+        print(f"Failed to download article {article.pmid} from {url}: {str(e)}")
+
+
+# FindIt reasons meaning the PDF is not accessible, as opposed to a failed lookup
+_FINDIT_NO_ACCESS = ("PAYWALL", "DENIED", "NOFORMAT")
+
+
+def _find_pdf(pmid: str) -> dict:
+    """
+    Locate the PDF of an article with FindIt.
+    Found URLs and definitive no-access results are cached so reruns skip the FindIt lookups;
+    other failures (e.g. TXERROR network errors) are looked up again on the next run.
+    Returns:
+        Dictionary with the PDF "url" (None if not found) and FindIt's "reason"
+    """
+    found = _cache.get("findit", pmid)
+    if found is None:
+        src = FindIt(pmid)
+        found = {"url": src.url, "reason": src.reason}
+        if src.url or (src.reason or "").startswith(_FINDIT_NO_ACCESS):
+            _cache.put_many("findit", {pmid: found})
+    return found
+
+
+def download_articles(articles, save_path="./", max_workers=8):
     save_path = Path(save_path)
-    for article in tqdm(articles, desc="Downloading articles"):
-        src = FindIt(article.pmid)
-        print(f"{article.pmid}: {src.url}")
-        print(f"reason: {src.reason}")
-        if src.url:
-            try:
-                response = requests.get(src.url)
-                response.raise_for_status()
-                file_path = save_path / f"{article.pmid}.pdf"
-                with file_path.open("wb") as file:
-                    file.write(response.content)
-            except requests.exceptions.RequestException as e:
-                print(f"Failed to download article {article.pmid} from {src.url}: {str(e)}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        # FindIt lookups stay in this thread; downloads run in the background while the next URL is resolved
+        for article in tqdm(articles, desc="Locating articles", **TQDM_OPTIONS):
+            found = _find_pdf(article.pmid)
+            print(f"{article.pmid}: {found['url']}")
+            print(f"reason: {found['reason']}")
+            if found["url"]:
+                futures.append(executor.submit(_download_one, article, found["url"], save_path, SESSION))
+
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Downloading articles", **TQDM_OPTIONS):
+            future.result()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,14 @@
 from textwrap import fill
+import inspect
 import re
 
 from tabulate import tabulate
 from more_itertools import chunked
 from IPython.display import Markdown
 
+_OPEN_FENCE = re.compile(r"^```.*\n")
+_CLOSE_FENCE = re.compile(r"```$")
+
 
 def pprint(text, width=80):
     print(fill(text, width=width))
@@ -16,8 +20,8 @@ def md(text):
 
 def remove_code_block(text):
     # Remove any code block indicators (e.g., ```python, ```json, etc.)
-    response_text = re.sub(r"^```.*\n", "", text)  # Remove opening marker
-    response_text = re.sub(r"```$", "", response_text)  # Remove closing marker
+    response_text = _OPEN_FENCE.sub("", text)  # Remove opening marker
+    response_text = _CLOSE_FENCE.sub("", response_text)  # Remove closing marker
     return response_text.strip()
 
 
@@ -29,7 +33,9 @@ def peep(obj):
     methods = []
 
     for attr in attrs:
-        if callable(getattr(obj, attr)):
+        # Look up without triggering properties or other descriptors, which may do expensive work (e.g. fetching)
+        value = inspect.getattr_static(obj, attr, None)
+        if callable(value) or isinstance(value, (classmethod, staticmethod)):
             methods.append(attr)
         else:
             properties.append(attr)